@@ -2,8 +2,13 @@
 
 from .v1.endpoints import router
 from .middlewares import TokenAuthMiddleware
+from .responses import ORJSONResponse, error_body, weak_etag, is_not_modified
 
 __all__ = [
     "router",
     "TokenAuthMiddleware",
+    "ORJSONResponse",
+    "error_body",
+    "weak_etag",
+    "is_not_modified",
 ]
\ No newline at end of file
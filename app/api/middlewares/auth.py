@@ -6,8 +6,9 @@ from typing import Optional
 from fastapi import Request, status
 from fastapi.security import HTTPBearer
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
 import os
+
+from app.api.responses import ORJSONResponse
 logger = logging.getLogger(__name__)
 
 from dotenv import load_dotenv
@@ -36,7 +37,7 @@ class TokenAuthMiddleware(BaseHTTPMiddleware):
         token = self._extract_token(request)
         
         if not token:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={
                     "error": "Missing authentication token",
@@ -46,7 +47,7 @@ class TokenAuthMiddleware(BaseHTTPMiddleware):
         
         # Validate token
         if not self._validate_token(token):
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={
                     "error": "Invalid or expired token",
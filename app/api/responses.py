@@ -0,0 +1,64 @@
+"""
+Shared response classes for the API
+"""
+import hashlib
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from app.core.models import utcnow
+
+# Naive datetimes are UTC; numpy values may come from embeddings
+_ORJSON_OPTS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _orjson_default(obj: Any) -> Any:
+    """Serialize types orjson does not handle natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def error_body(error: str, details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build an ErrorResponse-shaped dict without constructing and dumping the model"""
+    return {
+        "error": error,
+        "details": details,
+        "timestamp": utcnow().isoformat()
+    }
+
+
+def weak_etag(*parts: Any) -> str:
+    """Build a weak ETag from the values the response depends on"""
+    # Digested so it is the same in every worker and free of quotes from raw values
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode("utf-8"), digest_size=12)
+    return 'W/"' + digest.hexdigest() + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against the current ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses weak comparison: W/ prefixes are ignored and tags must match exactly
+    opaque = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # Models go straight through pydantic's Rust serializer to bytes
+        if isinstance(content, BaseModel):
+            return to_json(content)
+        return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTS)
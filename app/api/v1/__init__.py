@@ -7,6 +7,8 @@ from .v1_dto import (
     ErrorResponse,
     ReloadTemplatesResponse,
     ClearRAGCollectionResponse,
+    TemplateListResponse,
+    TemplateQueryRequest,
 )
 
 __all__ = [
@@ -16,4 +18,6 @@ __all__ = [
     "ErrorResponse",
     "ReloadTemplatesResponse",
     "ClearRAGCollectionResponse",
+    "TemplateListResponse",
+    "TemplateQueryRequest",
 ]
\ No newline at end of file
@@ -2,104 +2,185 @@
 API v1 endpoints for Nuclei template generation
 Simplified version without complex pattern
 """
+import asyncio
 import logging
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Request
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
+from app.api.responses import ORJSONResponse, error_body, weak_etag, is_not_modified
+from app.core.models import Severity
 from app.core.nuclei_service import NucleiTemplateService
 from .v1_dto import (
     TemplateGenerationRequest,
     TemplateGenerationResponse,
-    ErrorResponse,
     ReloadTemplatesResponse,
     ClearRAGCollectionResponse,
+    TemplateListResponse,
+    TemplateQueryRequest,
+    TagStr,
 )
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
 def get_nuclei_service(request: Request) -> NucleiTemplateService:
-    """Get or create NucleiTemplateService instance"""
-    if not hasattr(request.app.state, 'nuclei_service'):
-        request.app.state.nuclei_service = NucleiTemplateService()
+    """Get the NucleiTemplateService instance created at startup (called directly, not via Depends)"""
     return request.app.state.nuclei_service
 
-@router.post("/generate_template", response_model=TemplateGenerationResponse)
+@router.post("/generate_template")
 async def generate_template(
-    request_data: TemplateGenerationRequest,
-    service: NucleiTemplateService = Depends(get_nuclei_service)
+    request: Request,
+    request_data: TemplateGenerationRequest
 ) -> TemplateGenerationResponse:
     """
     Generate a new Nuclei security template from a simple text prompt.
     """
-    try:        
-        response = await service.generate_template(request_data)
-        return response
-        
-    except Exception as e:
-        logger.error(f"Error in generate_template endpoint: {e}")
+    service = get_nuclei_service(request)
+    timeout = service.settings.template_generation.timeout
+    try:
+        response = await asyncio.wait_for(service.generate_template(request_data), timeout=timeout)
+        # Returning a Response skips FastAPI's re-validation of the model we just built;
+        # the return annotation still documents the schema
+        return ORJSONResponse(response)
+
+    except asyncio.TimeoutError:
+        logger.error("Template generation timed out after %ss", timeout)
         raise HTTPException(
-            status_code=500,
-            detail=ErrorResponse(
-                error="Internal server error during template generation",
-                details={"exception": str(e)}
-            ).model_dump()
+            status_code=504,
+            detail=error_body("Template generation timed out", {"timeout": timeout})
         )
 
+@router.get("/templates")
+async def get_templates(
+    request: Request,
+    severity: Optional[Severity] = Query(None, description="Only return templates with this severity"),
+    tags: Optional[List[TagStr]] = Query(None, max_length=32, description="Only return templates with any of these tags"),
+    max_results: int = Query(10, ge=1, le=100, description="Maximum number of templates")
+) -> TemplateListResponse:
+    """
+    List templates in the RAG collection filtered by severity and/or tags.
+    Send `Accept: application/x-ndjson` to stream one template per line.
+    """
+    service = get_nuclei_service(request)
+    # The same URL serves JSON or NDJSON depending on Accept
+    headers = {"Vary": "Accept"}
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        async def stream():
+            async for template in service.rag_engine.stream_templates(severity, tags, max_results):
+                yield orjson.dumps(template) + b"\n"
+
+        return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+    # Results only change with the collection, so clients can revalidate cheaply. The
+    # collection id and size come from the stats snapshot, which every worker shares
+    stats = getattr(request.app.state, "collection_stats", {})
+    headers["ETag"] = weak_etag(
+        "templates",
+        stats.get("collection_id"),
+        stats.get("total_documents", 0),
+        severity,
+        sorted(set(tags)) if tags else None,
+        max_results
+    )
+    if is_not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    templates = await service.rag_engine.filter_templates(
+        severity=severity,
+        tags=tags,
+        max_results=max_results
+    )
+
+    return ORJSONResponse(
+        TemplateListResponse.model_construct(templates=templates, total_results=len(templates)),
+        headers=headers
+    )
+
+@router.post("/templates/query")
+async def query_templates(
+    request: Request,
+    query_data: TemplateQueryRequest
+) -> TemplateListResponse:
+    """
+    Find templates matching severity, tags and an optional free-text query in one vector DB call.
+    With a query, results are ranked by similarity.
+    """
+    service = get_nuclei_service(request)
+    templates = await service.rag_engine.query_templates(
+        query=query_data.query,
+        severity=query_data.severity,
+        tags=query_data.tags,
+        max_results=query_data.max_results
+    )
+
+    return ORJSONResponse(
+        TemplateListResponse.model_construct(templates=templates, total_results=len(templates))
+    )
+
+@router.post("/templates/query/stream")
+async def stream_query_templates(
+    request: Request,
+    query_data: TemplateQueryRequest
+) -> StreamingResponse:
+    """
+    Same as /templates/query, streamed as NDJSON with one template per line.
+    """
+    service = get_nuclei_service(request)
+
+    async def stream():
+        async for template in service.rag_engine.stream_query_templates(
+            query=query_data.query,
+            severity=query_data.severity,
+            tags=query_data.tags,
+            max_results=query_data.max_results
+        ):
+            yield orjson.dumps(template) + b"\n"
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
 @router.put("/reload_templates")
 async def reload_templates(
-    service: NucleiTemplateService = Depends(get_nuclei_service)
+    request: Request
 ) -> ReloadTemplatesResponse:
     """
     Reload all Nuclei templates into the RAG collection.
     """
-    try:        
-        count = await service.rag_engine.reload_templates()
-        
-        return ReloadTemplatesResponse(
+    service = get_nuclei_service(request)
+    count = await service.rag_engine.reload_templates()
+
+    return ORJSONResponse(
+        ReloadTemplatesResponse.model_construct(
             success=True,
             templates_loaded=count,
             message=f"Successfully reloaded {count} templates"
         )
-        
-    except Exception as e:
-        logger.error(f"Error reloading templates: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=ErrorResponse(
-                error="Internal server error during template reload",
-                details={"exception": str(e)}
-            ).model_dump()
-        )
+    )
 
 
 
 @router.delete("/rag_collection")
 async def clear_rag_collection(
-    service: NucleiTemplateService = Depends(get_nuclei_service)
+    request: Request
 ) -> ClearRAGCollectionResponse:
     """
     Clear all templates and embeddings from the RAG collection.
     """
-    try:        
-        if not service.rag_engine.initialized:
-            await service.rag_engine.initialize()
-        
-        result = await service.rag_engine.vector_db.clear_collection()
-        
-        return ClearRAGCollectionResponse(
-            status=result.get("status", "unknown"),
+    service = get_nuclei_service(request)
+    result = await service.rag_engine.clear_collection()
+
+    return ORJSONResponse(
+        ClearRAGCollectionResponse.model_construct(
+            status=result.get("status", "failed"),
             collection_name=result.get("collection_name"),
             message=result.get("message"),
             error=result.get("error"),
             cleared_count=result.get("cleared_count")
         )
-        
-    except Exception as e:
-        logger.error(f"Error clearing collection: {e}")
-        return ClearRAGCollectionResponse(
-            status="failed",
-            error=f"Internal server error during collection clear: {str(e)}"
-        )
\ No newline at end of file
+    )
@@ -1,45 +1,72 @@
 """
 DTOs for API v1 endpoints
 Contains Pydantic models for all API v1 endpoints including validation schemas
+
+Response DTOs are outbound-trusted: endpoints build them from service data with
+model_construct and return them in an ORJSONResponse, so FastAPI does not re-validate
+them against the route's response model. Request DTOs are always validated.
 """
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field, field_validator
+from typing import Annotated, Dict, List, Literal, Optional, Any
+from pydantic import BaseModel, ConfigDict, Field, SkipValidation, StringConstraints, field_validator
 
 # Import common models from core to avoid circular imports
-from app.core.models import TemplateGenerationRequest, TemplateGenerationResponse
+from app.core.models import TemplateGenerationRequest, TemplateGenerationResponse, Severity, utcnow
+
+# Constrained strings are checked inside pydantic-core instead of Python validators
+NonEmptyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+TagStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=50)]
+
+# Core schemas are built on first use instead of at import time
+REQUEST_MODEL_CONFIG = ConfigDict(defer_build=True)
+# Response DTOs are immutable once built
+RESPONSE_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore", defer_build=True)
 
 
 class ReloadTemplatesResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+    
     success: bool = Field(..., description="Whether reload was successful")
     templates_loaded: int = Field(..., ge=0, description="Number of templates loaded")
-    message: str = Field(..., description="Status message")
-    
-    @field_validator('message')
-    @classmethod
-    def validate_message(cls, v):
-        if not v or len(v.strip()) == 0:
-            raise ValueError('Message cannot be empty')
-        return v.strip()
+    message: NonEmptyStr = Field(..., description="Status message")
 
 
 class ClearRAGCollectionResponse(BaseModel):
-    status: str = Field(..., description="Operation status")
+    model_config = RESPONSE_MODEL_CONFIG
+    
+    status: Literal['success', 'failed', 'partial'] = Field(..., description="Operation status")
     collection_name: Optional[str] = Field(None, description="Collection name that was cleared")
     message: Optional[str] = Field(None, description="Status message")
     error: Optional[str] = Field(None, description="Error message if any")
     cleared_count: Optional[int] = Field(None, ge=0, description="Number of items cleared")
+
+
+class TemplateListResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+    
+    # Passed through from the vector DB as-is, no need to walk every key
+    templates: SkipValidation[List[Dict[str, Any]]] = Field(..., description="Metadata of the matching templates")
+    total_results: int = Field(..., ge=0, description="Number of templates returned")
+
+
+class TemplateQueryRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+    
+    query: Optional[str] = Field(None, max_length=2000, description="Free-text query to rank templates by similarity")
+    severity: Optional[Severity] = Field(None, description="Only return templates with this severity")
+    tags: Optional[List[TagStr]] = Field(None, max_length=32, description="Only return templates with any of these tags")
+    max_results: int = Field(10, ge=1, le=100, description="Maximum number of templates")
     
-    @field_validator('status')
+    @field_validator('query')
     @classmethod
-    def validate_status(cls, v):
-        valid_statuses = ['success', 'failed', 'partial']
-        if v not in valid_statuses:
-            raise ValueError(f'Status must be one of: {", ".join(valid_statuses)}')
-        return v
+    def validate_query(cls, v):
+        if v is None or len(v.strip()) == 0:
+            return None
+        return v.strip()
 
 
 class ErrorResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+    
     error: str = Field(..., description="Error message")
-    details: Optional[Dict[str, Any]] = Field(None, description="Error details")
-    timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
+    details: SkipValidation[Optional[Dict[str, Any]]] = Field(None, description="Error details")
+    timestamp: str = Field(default_factory=lambda: utcnow().isoformat())
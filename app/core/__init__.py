@@ -1,13 +1,23 @@
 """Core components for Nuclei AI Template Generator"""
 
-from .config_service import ConfigService
-from .rag_engine import RAGEngine
-from .vector_db import VectorDBService
-from .nuclei_service import NucleiTemplateService
-
-__all__ = [
-    "ConfigService",
-    "RAGEngine", 
-    "VectorDBService",
-    "NucleiTemplateService"
-]
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first attribute access (PEP 562), so importing
+# a light module such as app.core.models does not load ChromaDB or the LLM SDKs
+_LAZY_IMPORTS = {
+    "ConfigService": "config_service",
+    "RAGEngine": "rag_engine",
+    "VectorDBService": "vector_db",
+    "NucleiTemplateService": "nuclei_service",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(f"{__name__}.{_LAZY_IMPORTS[name]}")
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,5 @@
-from typing import List
-from pydantic import Field
+from typing import List, Optional
+from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -21,6 +21,8 @@ class LLMSettings(BaseSettings):
     temperature: float = Field(default=0.7, description="LLM temperature")
     max_tokens: int = Field(default=2000, description="Maximum tokens")
     timeout: int = Field(default=30, description="Request timeout in seconds")
+    gemini_api_key: Optional[SecretStr] = Field(default=None, validation_alias="GEMINI_API_KEY", description="Gemini API key")
+    openai_api_key: Optional[SecretStr] = Field(default=None, validation_alias="OPENAI_API_KEY", description="OpenAI API key")
 
     model_config = SettingsConfigDict(env_prefix="LLM_")
 
@@ -59,6 +61,11 @@ class RAGSettings(BaseSettings):
     max_retrieved_docs: int = Field(default=5, description="Maximum retrieved documents")
     similarity_threshold: float = Field(default=0.7, description="Similarity threshold")
     search_type: str = Field(default="similarity", description="Search type")
+    stats_refresh_interval: float = Field(default=5.0, description="Seconds between collection stats snapshot refreshes")
+    filter_cache_ttl: float = Field(default=300.0, description="Template filter results cache TTL in seconds")
+    retrieval_cache_ttl: float = Field(default=300.0, description="Similar template retrieval cache TTL in seconds")
+    batch_max_size: int = Field(default=16, description="Maximum similarity searches per batch")
+    batch_max_wait_ms: float = Field(default=5.0, description="Maximum time a search waits for its batch in milliseconds")
 
     model_config = SettingsConfigDict(env_prefix="RAG_")
 
@@ -68,6 +75,12 @@ class TemplateGenerationSettings(BaseSettings):
     max_retries: int = Field(default=3, description="Maximum retries for generation")
     output_format: str = Field(default="yaml", description="Output format")
     include_metadata: bool = Field(default=True, description="Include metadata")
+    timeout: int = Field(default=120, description="Template generation timeout in seconds")
+    response_cache_enabled: bool = Field(default=True, description="Reuse responses for near-identical prompts")
+    response_cache_threshold: float = Field(default=0.95, description="Minimum prompt similarity for a response cache hit")
+    response_cache_ttl: int = Field(default=86400, description="Response cache entry lifetime in seconds")
+    response_cache_max_temperature: float = Field(default=0.3, description="Response cache is skipped above this LLM temperature")
+    speculative_width: int = Field(default=1, ge=1, description="Candidates generated concurrently; the first with valid YAML is returned")
 
     model_config = SettingsConfigDict(env_prefix="TEMPLATE_")
 
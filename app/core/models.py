@@ -1,20 +1,38 @@
 """
 Common models and DTOs for the core application
 """
-from datetime import datetime
+from datetime import datetime, timezone
+from enum import StrEnum
 from typing import List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
+def utcnow() -> datetime:
+    """Timezone-aware replacement for the deprecated datetime.utcnow"""
+    return datetime.now(timezone.utc)
+
+
+class Severity(StrEnum):
+    """Nuclei template severity levels"""
+    INFO = "info"
+    LOW = "low"
+    MEDIUM = "medium"
+    HIGH = "high"
+    CRITICAL = "critical"
+
 
 class TemplateGenerationRequest(BaseModel):
     """Request model for template generation"""
+    model_config = ConfigDict(defer_build=True)
+    
     prompt: str = Field(..., min_length=10, max_length=2000, description="Text prompt describing the vulnerability or security test")
 
 
 class TemplateGenerationResponse(BaseModel):
     """Response model for template generation"""
+    model_config = ConfigDict(frozen=True, extra="ignore", defer_build=True)
+    
     success: bool = Field(..., description="Generation success status")
     template_id: str = Field(..., description="Generated template ID")
     generated_template: str = Field(..., description="Generated YAML template")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=utcnow)
\ No newline at end of file
@@ -1,11 +1,17 @@
 """
 Nuclei Template Service - Simplified service
 """
+import asyncio
 import logging
 import os
-import uuid
+import re
+import string
+import tempfile
+from collections import deque
+from contextlib import aclosing
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import yaml
 
 from langchain.schema import HumanMessage, SystemMessage
@@ -14,31 +20,130 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 from app.core.config_service import ConfigService
 from app.core.rag_engine import RAGEngine
+from app.core.response_cache import SemanticResponseCache
 from app.core.models import TemplateGenerationRequest, TemplateGenerationResponse
 
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 
 logger = logging.getLogger(__name__)
 
+# First ```yaml / ```yml fenced block, up to its closing fence or the end of the response
+YAML_FENCE_RE = re.compile(r"^[ \t]*```ya?ml[^\n]*\n(.*?)(?:^[ \t]*```[ \t\r]*$|\Z)", re.MULTILINE | re.DOTALL)
+# A complete fenced YAML block, used to stop streaming once the template is done
+YAML_FENCE_CLOSED_RE = re.compile(r"^[ \t]*```ya?ml[^\n]*\n.*?^[ \t]*```[ \t\r]*$", re.MULTILINE | re.DOTALL)
+# Top-level "id:" key of a generated template
+TEMPLATE_ID_RE = re.compile(r"""^id:[ \t]*["']?([^\s"'#]+)""", re.MULTILINE)
+TEMPLATE_ID_SCAN_LIMIT = 2048
+FALLBACK_ID_POOL_SIZE = 256
+# Top-level keys that mark where an unfenced template starts
+YAML_KEY_RE = re.compile(r"^[ \t]*(?:id|info|variables|requests|http|network|file):", re.MULTILINE)
+# A code fence or a markdown bold prose line at column 0 (never valid YAML) ends an unfenced
+# template; indented ones are content of block scalars such as raw requests
+TEMPLATE_END_RE = re.compile(r"^(?:```|\*\*)", re.MULTILINE)
+
+
+_fallback_ids: deque = deque()
+
+
+def next_fallback_id() -> str:
+    """Return an id for a template without one, drawing random bytes a pool at a time"""
+    if not _fallback_ids:
+        token = os.urandom(FALLBACK_ID_POOL_SIZE * 4).hex()
+        _fallback_ids.extend(f"generated_{token[i:i + 8]}" for i in range(0, len(token), 8))
+    return _fallback_ids.popleft()
+
+
+class PromptTemplate:
+    """str.format-compatible template parsed once, so rendering only joins the pieces"""
+    
+    def __init__(self, template: str):
+        self.template = template
+        self._pieces = []
+        self._simple = True
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+            # Specs, conversions and attribute lookups are left to str.format
+            if format_spec or conversion or (field_name is not None and not field_name.isidentifier()):
+                self._simple = False
+            self._pieces.append((literal, field_name))
+    
+    def format(self, **values: Any) -> str:
+        if not self._simple:
+            return self.template.format(**values)
+        parts = []
+        for literal, field_name in self._pieces:
+            parts.append(literal)
+            if field_name is not None:
+                parts.append(str(values[field_name]))
+        return "".join(parts)
+
+
+@lru_cache(maxsize=1)
+def load_system_prompt() -> str:
+    """Load system prompt from file or use default"""
+    prompt_path = Path("templates/nuclei_prompts/system_prompt.txt")
+    if prompt_path.exists():
+        return prompt_path.read_text(encoding='utf-8')
+    return "You are an expert Nuclei template generator. Generate valid YAML templates for security testing."
+
+
+@lru_cache(maxsize=1)
+def load_user_prompt_template() -> str:
+    """Load user prompt template from file or use default"""
+    template_path = Path("templates/nuclei_prompts/user_prompt_template.txt")
+    if template_path.exists():
+        return template_path.read_text(encoding='utf-8')
+    return """Generate a Nuclei template based on the following request:
+
+{prompt}
+
+Similar templates for reference:
+{retrieval_context}
+
+Please generate a complete, valid YAML Nuclei template that tests for the described vulnerability or security issue."""
+
 
 class NucleiTemplateService:
     """Nuclei Template Service"""
     
+    # LLM clients hold their own connection pools, share one per process
+    _shared_llm = None
+    _shared: Optional["NucleiTemplateService"] = None
+    
+    @classmethod
+    def get_shared(cls) -> "NucleiTemplateService":
+        """Get the process-wide service, so prompts, LLM client and response cache are set up once"""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+    
     def __init__(self):
         self.settings = ConfigService.get_settings()
-        self.rag_engine = RAGEngine()
-        self.llm = self._initialize_llm()
+        self.rag_engine = RAGEngine.get_shared()
+        self.llm = self._get_shared_llm()
         self.model_name = self._get_model_name()
-        self.system_prompt = self._load_system_prompt()
-        self.user_prompt_template = self._load_user_prompt_template()
+        self.system_prompt = load_system_prompt()
+        self.user_prompt_template = PromptTemplate(load_user_prompt_template())
+        self.response_cache = self._initialize_response_cache()
         
+    def _get_shared_llm(self):
+        """Get the process-wide LLM client, creating it on first use"""
+        if NucleiTemplateService._shared_llm is None:
+            NucleiTemplateService._shared_llm = self._initialize_llm()
+        return NucleiTemplateService._shared_llm
+    
     def _initialize_llm(self):
-        """Initialize LLM from environment variables"""
+        """Initialize LLM from settings"""
         provider = self.settings.llm.provider
         
-        logger.info(f"Initializing LLM with provider: {provider}")
+        logger.info("Initializing LLM with provider: %s", provider)
         
         if provider == "gemini":
-            api_key = os.getenv("GEMINI_API_KEY")
+            api_key = self.settings.llm.gemini_api_key
             if not api_key:
                 raise ValueError("GEMINI_API_KEY environment variable is required for Gemini provider")
             
@@ -47,10 +152,10 @@ class NucleiTemplateService:
                 temperature=self.settings.llm.temperature,
                 max_tokens=self.settings.llm.max_tokens,
                 timeout=self.settings.llm.timeout,
-                google_api_key=api_key
+                google_api_key=api_key.get_secret_value()
             )
         else:  # OpenAI
-            api_key = os.getenv("OPENAI_API_KEY")
+            api_key = self.settings.llm.openai_api_key
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable is required for OpenAI provider")
             
@@ -59,35 +164,26 @@ class NucleiTemplateService:
                 temperature=self.settings.llm.temperature,
                 max_tokens=self.settings.llm.max_tokens,
                 timeout=self.settings.llm.timeout,
-                openai_api_key=api_key
+                openai_api_key=api_key.get_secret_value()
             )
     
+    def _initialize_response_cache(self) -> Optional[SemanticResponseCache]:
+        """Create the semantic response cache when enabled"""
+        generation = self.settings.template_generation
+        # With a high temperature callers expect varied output, so don't replay old responses
+        if not generation.response_cache_enabled or self.settings.llm.temperature > generation.response_cache_max_temperature:
+            return None
+        
+        return SemanticResponseCache(
+            self.rag_engine.vector_db,
+            similarity_threshold=generation.response_cache_threshold,
+            ttl=generation.response_cache_ttl
+        )
+    
     def _get_model_name(self) -> str:
         """Get the model name from configuration"""
         return self.settings.llm.model
     
-    def _load_system_prompt(self) -> str:
-        """Load system prompt from file or use default"""
-        prompt_path = Path("templates/nuclei_prompts/system_prompt.txt")
-        if prompt_path.exists():
-            return prompt_path.read_text(encoding='utf-8')
-        return "You are an expert Nuclei template generator. Generate valid YAML templates for security testing."
-    
-    def _load_user_prompt_template(self) -> str:
-        """Load user prompt template from file or use default"""
-        template_path = Path("templates/nuclei_prompts/user_prompt_template.txt")
-        if template_path.exists():
-            return template_path.read_text(encoding='utf-8')
-        return """Generate a Nuclei template based on the following request:
-
-{prompt}
-
-Similar templates for reference:
-{retrieval_context}
-
-Please generate a complete, valid YAML Nuclei template that tests for the described vulnerability or security issue."""
-
-
     async def search_templates(
         self, 
         query: str, 
@@ -95,9 +191,6 @@ Please generate a complete, valid YAML Nuclei template that tests for the descri
         similarity_threshold: float = 0.7
     ) -> List[Dict[str, Any]]:
         """Search for similar templates using RAG"""
-        if not self.rag_engine.initialized:
-            await self.rag_engine.initialize()
-        
         return await self.rag_engine.retrieve_similar_templates(
             query=query,
             max_results=max_results,
@@ -107,42 +200,99 @@ Please generate a complete, valid YAML Nuclei template that tests for the descri
     
     async def generate_template(self, request: TemplateGenerationRequest) -> TemplateGenerationResponse:
         """Generate a Nuclei template"""        
-        try:
-            # Initialize RAG engine if needed
-            if not self.rag_engine.initialized:
-                await self.rag_engine.initialize()
-            
-            # Retrieve similar templates for context
-            similar_templates = await self.rag_engine.retrieve_similar_templates(
+        # Start retrieval right away so it overlaps with embedding the prompt for the response cache
+        retrieval_task = asyncio.create_task(
+            self.rag_engine.retrieve_similar_templates(
                 query=request.prompt,
                 max_results=self.settings.rag.max_retrieved_docs
             )
+        )
+        try:
+            cache_embedding = None
+            if self.response_cache:
+                try:
+                    cache_embedding = await self.response_cache.embed(request.prompt)
+                except Exception as e:
+                    # The cache is an optimization, a failure here only means a miss
+                    logger.warning("Response cache embedding failed: %s", e)
+            
+            # Retrieve similar templates for context
+            similar_templates = await retrieval_task
             
             # Format retrieval context
             retrieval_context = self.rag_engine.format_retrieval_context(similar_templates)
+            
+            # A hit must have been generated from the same context, so reloaded templates are picked up
+            if cache_embedding:
+                cached_response = await self.response_cache.lookup(cache_embedding, retrieval_context)
+                if cached_response:
+                    return cached_response
 
             # Generate template
-            generated_template = await self._generate_template_content(request, retrieval_context)
+            generated_template = await self._generate_best_candidate(request, retrieval_context)
             
             # Extract template ID
             template_id = self._extract_template_id(generated_template)
             
             # Create response
-            response = TemplateGenerationResponse(
+            # Built from our own data, so skip validation
+            response = TemplateGenerationResponse.model_construct(
                 success=True,
                 template_id=template_id,
                 generated_template=generated_template,             
             )
             
+            if cache_embedding and self._is_valid_yaml(generated_template):
+                await self.response_cache.store(request.prompt, cache_embedding, retrieval_context, response)
+            
             return response
             
         except Exception as e:
-            logger.error(f"Template generation failed: {e}")
-            return TemplateGenerationResponse(
+            logger.error("Template generation failed: %s", e)
+            return TemplateGenerationResponse.model_construct(
                 success=False,
                 template_id="failed_generation",
                 generated_template=""
             )
+        finally:
+            # Not needed after a cache hit, and must not outlive a cancelled request
+            retrieval_task.cancel()
+    
+    async def _generate_best_candidate(
+        self,
+        request: TemplateGenerationRequest,
+        retrieval_context: str
+    ) -> str:
+        """Generate candidates concurrently and keep the first one with valid YAML"""
+        width = self.settings.template_generation.speculative_width
+        if width <= 1:
+            return await self._generate_template_content(request, retrieval_context)
+        
+        # Costs width times the tokens, but a bad first candidate no longer costs another round-trip
+        tasks = [
+            asyncio.create_task(self._generate_template_content(request, retrieval_context))
+            for _ in range(width)
+        ]
+        generated = []
+        first_error = None
+        try:
+            # Return as soon as any candidate is valid instead of waiting for the slowest one
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    candidate = await next_done
+                except Exception as e:
+                    first_error = first_error or e
+                    continue
+                if self._is_valid_yaml(candidate):
+                    return candidate
+                generated.append(candidate)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if not generated:
+            raise first_error
+        return generated[0]
     
     async def _generate_template_content(
         self, 
@@ -162,9 +312,15 @@ Please generate a complete, valid YAML Nuclei template that tests for the descri
             HumanMessage(content=user_prompt)
         ]
         
-        # Generate template
-        response = await self.llm.agenerate([messages])
-        generated_content = response.generations[0][0].text.strip()
+        # Generate template, stopping as soon as the fenced YAML block is closed
+        # instead of waiting for any explanation the model adds after it
+        parts = []
+        async with aclosing(self.llm.astream(messages)) as stream:
+            async for chunk in stream:
+                parts.append(chunk.content)
+                if "`" in chunk.content and YAML_FENCE_CLOSED_RE.search("".join(parts)):
+                    break
+        generated_content = "".join(parts).strip()
         
         # Extract YAML from response (in case it's wrapped in markdown)
         yaml_content = self._extract_yaml_content(generated_content)
@@ -174,48 +330,21 @@ Please generate a complete, valid YAML Nuclei template that tests for the descri
     
     def _extract_yaml_content(self, content: str) -> str:
         """Extract YAML content from LLM response"""
-        lines = content.split('\n')
-        yaml_lines = []
-        in_yaml_block = False
-        found_yaml_block = False
-        
         # First, try to find YAML code blocks
-        for line in lines:
-            if line.strip().startswith('```yaml') or line.strip().startswith('```yml'):
-                in_yaml_block = True
-                found_yaml_block = True
-                continue
-            elif line.strip() == '```' and in_yaml_block:
-                in_yaml_block = False
-                break
-            elif in_yaml_block:
-                yaml_lines.append(line)
+        fence = YAML_FENCE_RE.search(content)
         
         # If YAML block found, use it
-        if found_yaml_block and yaml_lines:
-            yaml_content = '\n'.join(yaml_lines).strip()
+        if fence and fence.group(1):
+            yaml_content = fence.group(1).strip()
         else:
-            # No YAML block found, try to extract YAML from the entire content
-            # Look for lines that start with YAML keys (id:, info:, requests:, etc.)
-            yaml_started = False
-            for line in lines:
-                line_stripped = line.strip()
-                # Skip markdown headers, explanations, etc.
-                if line_stripped.startswith('#') and not yaml_started:
-                    continue
-                if line_stripped.startswith('**') or line_stripped.startswith('*') and not yaml_started:
-                    continue
-                if line_stripped.startswith('```') and not line_stripped.startswith('```yaml'):
-                    continue
-                    
-                # Check for YAML structure start
-                if line_stripped.startswith(('id:', 'info:', 'variables:', 'requests:', 'http:', 'network:', 'file:')):
-                    yaml_started = True
-                    
-                if yaml_started:
-                    yaml_lines.append(line)
-            
-            yaml_content = '\n'.join(yaml_lines).strip()
+            # No YAML block found: the template starts at the first top-level key
+            # and runs to the next code fence or prose line, so slice it out of the response
+            key = YAML_KEY_RE.search(content)
+            if key:
+                end = TEMPLATE_END_RE.search(content, key.start())
+                yaml_content = content[key.start():end.start() if end else len(content)].strip()
+            else:
+                yaml_content = ""
         
         # If still no content, use the entire response as fallback
         if not yaml_content:
@@ -226,19 +355,40 @@ Please generate a complete, valid YAML Nuclei template that tests for the descri
     def _validate_yaml_syntax(self, yaml_content: str) -> None:
         """Validate YAML syntax before nuclei validation"""
         try:
-            yaml.safe_load(yaml_content)
+            yaml.load(yaml_content, Loader=SafeLoader)
         except yaml.YAMLError as e:
             # Save problematic YAML to temp file for debugging
             with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
                 f.write(yaml_content)
-                logger.error(f"Problematic YAML saved to: {f.name}")
+                logger.error("Problematic YAML saved to: %s", f.name)
             raise ValueError(f"Generated content is not valid YAML: {e}")
     
+    def _is_valid_yaml(self, yaml_content: str) -> bool:
+        """Check that content loads as YAML, without raising, logging or writing debug files"""
+        # An invalid candidate is an expected outcome of speculative generation, not an error
+        try:
+            yaml.load(yaml_content, Loader=SafeLoader)
+            return True
+        except yaml.YAMLError:
+            return False
+    
     def _extract_template_id(self, template_content: str) -> str:
         """Extract template ID from generated content"""
+        # Nuclei templates put the id first, so only the head of the document is scanned.
+        # The window ends on a line boundary so an id crossing the limit is not truncated
+        scan_end = len(template_content)
+        if scan_end > TEMPLATE_ID_SCAN_LIMIT:
+            scan_end = max(template_content.rfind("\n", 0, TEMPLATE_ID_SCAN_LIMIT), 0)
+        match = TEMPLATE_ID_RE.search(template_content, 0, scan_end)
+        if match:
+            return match.group(1)
+
+        # Rare layouts (flow mappings, id further down) still need a full parse
         try:
-            template_data = yaml.safe_load(template_content)
-            return template_data.get("id", f"generated_{uuid.uuid4().hex[:8]}")
-        except:
-            return f"generated_{uuid.uuid4().hex[:8]}"
+            template_data = yaml.load(template_content, Loader=SafeLoader)
+        except yaml.YAMLError:
+            template_data = None
+        if isinstance(template_data, dict) and template_data.get("id"):
+            return str(template_data["id"])
+        return next_fallback_id()
     
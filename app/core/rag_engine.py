@@ -1,17 +1,51 @@
 """
 RAG Engine for retrieving and generating Nuclei templates using similar templates
 """
+import asyncio
 import logging
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+from prometheus_client import Counter
 
 from app.core.config_service import ConfigService
+from app.core.search_batcher import SearchBatcher
 from app.core.vector_db import VectorDBService
 
 logger = logging.getLogger(__name__)
 
+FILTER_CACHE_MAX_ENTRIES = 256
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024
+
+# Retrieval context layout for the generation prompt
+CONTEXT_HEADER = "\n" + "=" * 80
+CONTEXT_CONTENT_LIMIT = 800
+
+FILTER_CACHE_REQUESTS = Counter(
+    "rag_filter_cache_requests_total",
+    "Template filter lookups by cache result",
+    ["result"]
+)
+
+RETRIEVAL_CACHE_REQUESTS = Counter(
+    "rag_retrieval_cache_requests_total",
+    "Similar template retrievals by cache result",
+    ["result"]
+)
+
 
 class RAGEngine:
+    _shared: Optional["RAGEngine"] = None
+    
+    @classmethod
+    def get_shared(cls) -> "RAGEngine":
+        """Get the settings-configured RAGEngine singleton, so the embedding model is loaded once"""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         if config is None:
             self.settings = ConfigService.get_settings()
@@ -32,18 +66,36 @@ class RAGEngine:
             self.settings = None
             self.vector_db = VectorDBService(config.get("vector_db", {}))
         self.initialized = False
+        # (collection id, document count) the caches were filled from
+        self.collection_marker: Optional[Tuple[str, int]] = None
+        self._init_lock = asyncio.Lock()
+        self._filter_ttl = self.settings.rag.filter_cache_ttl if self.settings else 300.0
+        self._filter_cache: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._retrieval_ttl = self.settings.rag.retrieval_cache_ttl if self.settings else 300.0
+        # Holds the search task itself, so concurrent identical queries share one search
+        self._retrieval_cache: "OrderedDict[Tuple, Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.search_batcher = SearchBatcher(
+            self.vector_db.search_similar_batch,
+            max_size=self.settings.rag.batch_max_size if self.settings else 16,
+            max_wait_ms=self.settings.rag.batch_max_wait_ms if self.settings else 5.0
+        )
     
     async def initialize(self):
         if self.initialized:
             return
         
-        try:
-            await self.vector_db.initialize()
-            self.initialized = True
-            logger.info("RAG Engine initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize RAG Engine: {e}")
-            raise
+        # Concurrent first callers wait for a single initialization
+        async with self._init_lock:
+            if self.initialized:
+                return
+            
+            try:
+                await self.vector_db.initialize()
+                self.initialized = True
+                logger.info("RAG Engine initialized successfully")
+            except Exception as e:
+                logger.error("Failed to initialize RAG Engine: %s", e)
+                raise
     
     async def retrieve_similar_templates(
         self,
@@ -62,30 +114,125 @@ class RAGEngine:
             max_results = max_results or 5
             similarity_threshold = similarity_threshold or 0.7
         
-        try:
-            results = await self.vector_db.search_similar(
+        key = (query, max_results, similarity_threshold)
+        now = time.monotonic()
+        cached = self._retrieval_cache.get(key)
+        if cached and now - cached[0] < self._retrieval_ttl:
+            RETRIEVAL_CACHE_REQUESTS.labels(result="hit").inc()
+            self._retrieval_cache.move_to_end(key)
+            search = cached[1]
+        else:
+            RETRIEVAL_CACHE_REQUESTS.labels(result="miss").inc()
+            # Concurrent searches share one embedding pass and vector DB query
+            search = asyncio.ensure_future(self.search_batcher.search(
                 query=query,
                 max_results=max_results,
                 similarity_threshold=similarity_threshold
-            )
-            return results
+            ))
+            self._retrieval_cache[key] = (now, search)
+            if len(self._retrieval_cache) > RETRIEVAL_CACHE_MAX_ENTRIES:
+                self._retrieval_cache.popitem(last=False)
+        
+        try:
+            # Shielded so a cancelled caller does not cancel the search other callers share
+            return await asyncio.shield(search)
             
         except Exception as e:
-            logger.error(f"Error retrieving similar templates: {e}")
+            if self._retrieval_cache.get(key, (None, None))[1] is search:
+                del self._retrieval_cache[key]
+            logger.error("Error retrieving similar templates: %s", e)
             return []
     
+    async def filter_templates(
+        self,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> List[Dict[str, Any]]:
+        if not self.initialized:
+            await self.initialize()
+        
+        key = (severity, tuple(sorted(tags)) if tags else None, max_results)
+        now = time.monotonic()
+        cached = self._filter_cache.get(key)
+        if cached and now - cached[0] < self._filter_ttl:
+            FILTER_CACHE_REQUESTS.labels(result="hit").inc()
+            self._filter_cache.move_to_end(key)
+            return cached[1]
+        FILTER_CACHE_REQUESTS.labels(result="miss").inc()
+        
+        templates = await self.vector_db.filter_templates(
+            severity=severity,
+            tags=tags,
+            max_results=max_results
+        )
+        
+        self._filter_cache[key] = (now, templates)
+        self._filter_cache.move_to_end(key)
+        if len(self._filter_cache) > FILTER_CACHE_MAX_ENTRIES:
+            self._filter_cache.popitem(last=False)
+        return templates
+    
+    async def query_templates(
+        self,
+        query: Optional[str] = None,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> List[Dict[str, Any]]:
+        if not query:
+            return await self.filter_templates(severity, tags, max_results)
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        return await self.vector_db.search_filtered(query, severity, tags, max_results)
+    
+    async def stream_templates(
+        self,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not self.initialized:
+            await self.initialize()
+        
+        async for template in self.vector_db.iter_filtered_templates(severity, tags, max_results):
+            yield template
+    
+    async def stream_query_templates(
+        self,
+        query: Optional[str] = None,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not query:
+            async for template in self.stream_templates(severity, tags, max_results):
+                yield template
+            return
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        async for template in self.vector_db.iter_search_filtered(query, severity, tags, max_results):
+            yield template
+    
     def format_retrieval_context(self, retrieved_docs: List[Dict[str, Any]]) -> str:
         if not retrieved_docs:
             return "No similar templates found."
         
-        context_parts = []
+        # One join over all pieces instead of a string per template plus a second join
+        parts = [CONTEXT_HEADER]
         for i, doc in enumerate(retrieved_docs):
             metadata = doc.get("metadata", {})
-            similarity = doc.get("similarity", 0)
             content = doc.get("content", "")
+            snippet = content[:CONTEXT_CONTENT_LIMIT]
             
-            template_info = f"""
-Template {i+1} (Similarity: {similarity:.2f}):
+            parts.extend((
+                "\n" if i else "",
+                f"""
+Template {i+1} (Similarity: {doc.get("similarity", 0):.2f}):
 - ID: {metadata.get('template_id', 'unknown')}
 - Name: {metadata.get('name', 'Unknown')}
 - Severity: {metadata.get('severity', 'Unknown')}
@@ -95,18 +242,44 @@ Template {i+1} (Similarity: {similarity:.2f}):
 
 Template Content:
 ```yaml
-{content[:800]}{'...' if len(content) > 800 else ''}
-```
-"""
-            context_parts.append(template_info)
+""",
+                snippet,
+                "...\n```\n" if len(content) > CONTEXT_CONTENT_LIMIT else "\n```\n"
+            ))
         
-        return "\n" + "="*80 + "\n".join(context_parts)
+        return "".join(parts)
 
     async def get_collection_stats(self) -> Dict[str, Any]:
         if not self.initialized:
             await self.initialize()
         
-        return await self.vector_db.get_collection_stats()
+        stats = await self.vector_db.get_collection_stats()
+        
+        # Caches are per process: a clear or reload served by another worker shows up
+        # here as a new collection id or document count within one stats refresh.
+        # The count also changes while a reload is still loading into the same
+        # collection, so results cached mid-load are dropped as well
+        collection_id = stats.get("collection_id")
+        if collection_id:
+            marker = (collection_id, stats.get("total_documents", 0))
+            if marker != self.collection_marker:
+                if self.collection_marker is not None:
+                    self.invalidate_caches()
+                self.collection_marker = marker
+        return stats
+    
+    def invalidate_caches(self):
+        """Drop cached results after the collection contents change"""
+        self._filter_cache.clear()
+        self._retrieval_cache.clear()
+    
+    async def clear_collection(self) -> Dict[str, Any]:
+        if not self.initialized:
+            await self.initialize()
+        
+        result = await self.vector_db.clear_collection()
+        self.invalidate_caches()
+        return result
     
     
     async def reload_templates(self, templates_dir: Optional[Path] = None) -> int:
@@ -122,5 +295,17 @@ Template Content:
         
         # Reload templates
         count = await self.vector_db.bulk_load_templates(templates_dir)
+        self.invalidate_caches()
+        
+        return count
+    
+    async def update_rag_data(self, rag_data_path: str = "rag_data") -> Dict[str, Any]:
+        if not self.initialized:
+            await self.initialize()
         
-        return count
\ No newline at end of file
+        result = await self.vector_db.update_rag_data(rag_data_path)
+        self.invalidate_caches()
+        return result
+    
+    async def close(self):
+        await self.search_batcher.close()
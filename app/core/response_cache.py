@@ -0,0 +1,135 @@
+"""
+Semantic cache of generated templates keyed by the prompt embedding
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.models import TemplateGenerationResponse, utcnow
+from app.core.vector_db import VectorDBService
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_PRUNE_INTERVAL = 3600
+
+
+class SemanticResponseCache:
+    """
+    Return a previous generation when a new prompt is close enough to one already answered
+    with the same retrieval context. Only valid YAML is stored.
+    Entries live in their own ChromaDB collection next to the templates collection.
+    """
+
+    def __init__(
+        self,
+        vector_db: VectorDBService,
+        collection_name: str = "nuclei_response_cache",
+        similarity_threshold: float = 0.95,
+        ttl: float = 86400
+    ):
+        self.vector_db = vector_db
+        self.collection_name = collection_name
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.collection = None
+        self._last_prune = 0.0
+
+    def _get_collection(self):
+        if self.collection is None:
+            self.collection = self.vector_db.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata={"hnsw:space": "cosine"}
+            )
+        return self.collection
+
+    def _with_collection(self, operation: Callable[[Any], Any]) -> Any:
+        try:
+            return operation(self._get_collection())
+        except Exception:
+            # Another process may have deleted or recreated the collection, and the
+            # not-found error type differs between ChromaDB versions, so resolve it once more
+            self.collection = None
+            return operation(self._get_collection())
+
+    @staticmethod
+    def _context_hash(retrieval_context: str) -> str:
+        return hashlib.blake2b(retrieval_context.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def embed(self, prompt: str) -> List[float]:
+        # Off the event loop, so a retrieval started alongside can make progress
+        embeddings = await asyncio.to_thread(self.vector_db.embed_queries, [prompt])
+        return embeddings[0]
+
+    async def lookup(self, embedding: List[float], retrieval_context: str) -> Optional[TemplateGenerationResponse]:
+        try:
+            # Collection calls are network round-trips in client mode, keep them off the event loop
+            results = await asyncio.to_thread(self._query, embedding, retrieval_context)
+        except Exception as e:
+            logger.warning("Response cache lookup failed: %s", e)
+            return None
+
+        if not results or not results["ids"] or not results["ids"][0]:
+            return None
+
+        similarity = 1 - results["distances"][0][0]
+        if similarity < self.similarity_threshold:
+            return None
+
+        logger.debug("Response cache hit (similarity %.3f)", similarity)
+        cached = TemplateGenerationResponse.model_validate_json(results["documents"][0][0])
+        # The template is reused, but this response is created now
+        return cached.model_copy(update={"created_at": utcnow()})
+
+    def _query(self, embedding: List[float], retrieval_context: str) -> Optional[Dict[str, Any]]:
+        where = {"$and": [
+            {"context_hash": self._context_hash(retrieval_context)},
+            {"cached_at": {"$gte": time.time() - self.ttl}}
+        ]}
+
+        def query(collection) -> Optional[Dict[str, Any]]:
+            if collection.count() == 0:
+                return None
+            # Expired entries are filtered out so they cannot shadow a fresh neighbour
+            return collection.query(
+                query_embeddings=[embedding],
+                n_results=1,
+                where=where,
+                include=["documents", "metadatas", "distances"]
+            )
+
+        return self._with_collection(query)
+
+    async def store(
+        self,
+        prompt: str,
+        embedding: List[float],
+        retrieval_context: str,
+        response: TemplateGenerationResponse
+    ):
+        try:
+            await asyncio.to_thread(self._upsert, prompt, embedding, retrieval_context, response)
+        except Exception as e:
+            logger.warning("Failed to store response in cache: %s", e)
+
+    def _upsert(
+        self,
+        prompt: str,
+        embedding: List[float],
+        retrieval_context: str,
+        response: TemplateGenerationResponse
+    ):
+        now = time.time()
+        # Keyed by prompt so repeating the exact prompt refreshes its entry
+        self._with_collection(lambda collection: collection.upsert(
+            ids=[hashlib.sha256(prompt.encode("utf-8")).hexdigest()],
+            embeddings=[embedding],
+            documents=[response.model_dump_json()],
+            metadatas=[{"cached_at": now, "context_hash": self._context_hash(retrieval_context)}]
+        ))
+
+        # Entries are never read after they expire, so delete them now and then to bound the collection
+        if now - self._last_prune >= RESPONSE_CACHE_PRUNE_INTERVAL:
+            self._last_prune = now
+            self.collection.delete(where={"cached_at": {"$lt": now - self.ttl}})
@@ -0,0 +1,103 @@
+"""
+Dynamic batching of similarity searches issued by concurrent requests
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SearchBatchFn = Callable[[List[str], int, float], Awaitable[List[List[Dict[str, Any]]]]]
+
+
+class SearchBatcher:
+    """
+    Queue searches for up to max_wait_ms and run them as one batched embedding
+    and one vector DB query per (max_results, similarity_threshold) group
+    """
+
+    def __init__(self, search_batch: SearchBatchFn, max_size: int = 16, max_wait_ms: float = 5.0):
+        self.search_batch = search_batch
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            worker, self._worker = self._worker, None
+            worker.cancel()
+            # Let the worker fail its in-flight batch before the queue is drained
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        
+        # Fail searches that never reached a batch, so their callers do not wait forever
+        while self._queue is not None and not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Search batcher closed"))
+
+    async def search(
+        self,
+        query: str,
+        max_results: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, max_results, similarity_threshold, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._dispatch(batch)
+        except asyncio.CancelledError:
+            # Searches taken off the queue but not answered yet
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Search batcher closed"))
+            raise
+
+    async def _dispatch(self, batch: List[Tuple[str, int, float, asyncio.Future]]):
+        # One collection query needs a single n_results, so group by search parameters
+        groups: Dict[Tuple[int, float], List[Tuple[str, int, float, asyncio.Future]]] = {}
+        for item in batch:
+            groups.setdefault((item[1], item[2]), []).append(item)
+
+        for (max_results, similarity_threshold), items in groups.items():
+            try:
+                results = await self.search_batch(
+                    [query for query, _, _, _ in items],
+                    max_results,
+                    similarity_threshold
+                )
+            except Exception as e:
+                logger.error("Batched similarity search failed for %s queries: %s", len(items), e)
+                for _, _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, _, _, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
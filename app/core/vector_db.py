@@ -1,11 +1,11 @@
 """
 Vector database service for storing and retrieving Nuclei template embeddings
 """
+import asyncio
 import logging
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional
 import yaml
-import subprocess
 import shutil
 import chromadb
 from chromadb.config import Settings
@@ -15,9 +15,21 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from sentence_transformers import SentenceTransformer
 
+from app.core.models import Severity
+
 
 logger = logging.getLogger(__name__)
 
+# Prefer the libyaml-backed loader; bulk loading parses thousands of templates
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+VALID_SEVERITIES = frozenset(Severity)
+# Metadata rows read per round-trip when tag filtering has to happen client-side
+FILTER_PAGE_SIZE = 256
+
 
 class VectorDBService:
     def __init__(self, config: Dict[str, Any]):
@@ -46,11 +58,11 @@ class VectorDBService:
                 # Try to load from local cache first
                 self.embeddings = SentenceTransformer(embedding_model, local_files_only=True)
             except Exception as e:
-                logger.warning(f"Failed to load model from cache: {e}")
+                logger.warning("Failed to load model from cache: %s", e)
                 try:
                     self.embeddings = SentenceTransformer(embedding_model)
                 except Exception as download_error:
-                    logger.error(f"Failed to download model: {download_error}")
+                    logger.error("Failed to download model: %s", download_error)
                     self.embeddings = SentenceTransformer('all-MiniLM-L6-v2', local_files_only=True)
     
     """
@@ -90,12 +102,12 @@ class VectorDBService:
                 # First attempt: normal removal
                 shutil.rmtree(path)
         except (PermissionError, OSError) as e:
-            logger.warning(f"First removal attempt failed: {e}, trying with forced removal")
+            logger.warning("First removal attempt failed: %s, trying with forced removal", e)
             try:
                 # Second attempt: force remove read-only files
                 shutil.rmtree(path, onerror=self._force_remove_readonly)
             except Exception as e2:
-                logger.warning(f"Forced removal failed: {e2}, trying alternative approach")
+                logger.warning("Forced removal failed: %s, trying alternative approach", e2)
                 try:
                     # Third attempt: change permissions recursively then remove
                     for root, dirs, files in os.walk(path):
@@ -113,7 +125,7 @@ class VectorDBService:
                                 pass
                     shutil.rmtree(path)
                 except Exception as e3:
-                    logger.error(f"All removal attempts failed: {e3}")
+                    logger.error("All removal attempts failed: %s", e3)
                     raise
     
     """
@@ -141,7 +153,7 @@ class VectorDBService:
             host = self.config.get("host", os.getenv("VECTOR_DB_HOST", os.getenv("CHROMADB_HOST", "localhost")))
             port = self.config.get("port", int(os.getenv("VECTOR_DB_PORT", os.getenv("CHROMADB_PORT", "8001"))))
             
-            logger.info(f"Connecting to ChromaDB server at {host}:{port}")
+            logger.info("Connecting to ChromaDB server at %s:%s", host, port)
             self.client = chromadb.HttpClient(
                 host=host,
                 port=port,
@@ -157,7 +169,7 @@ class VectorDBService:
             # Ensure directory exists
             Path(persist_directory).mkdir(parents=True, exist_ok=True)
             
-            logger.info(f"Using embedded ChromaDB at {persist_directory}")
+            logger.info("Using embedded ChromaDB at %s", persist_directory)
             self.client = chromadb.PersistentClient(
                 path=persist_directory,
                 settings=Settings(
@@ -168,13 +180,13 @@ class VectorDBService:
         
         try:
             self.collection = self.client.get_collection(collection_name)
-            logger.info(f"Loaded existing collection: {collection_name}")
+            logger.info("Loaded existing collection: %s", collection_name)
         except Exception:
             self.collection = self.client.create_collection(
                 name=collection_name,
                 metadata={"hnsw:space": "cosine"}
             )
-            logger.info(f"Created new collection: {collection_name}")
+            logger.info("Created new collection: %s", collection_name)
     
     """
     Add documents to the vector database
@@ -198,28 +210,35 @@ class VectorDBService:
         for i in range(0, len(processed_docs), batch_size):
             batch_docs = processed_docs[i:i + batch_size]
             
-            # Generate embeddings for batch
-            texts = [doc["content"] for doc in batch_docs]
-            if hasattr(self.embeddings, 'embed_documents'):
-                embeddings = self.embeddings.embed_documents(texts)
-            else:
-                embeddings = self.embeddings.encode(texts).tolist()
-            
-            # Add batch to collection
-            ids = [doc["id"] for doc in batch_docs]
-            metadatas = [doc["metadata"] for doc in batch_docs]
-            
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
+            # Embedding is CPU/network bound, keep it off the event loop
+            await asyncio.to_thread(self._embed_and_add, batch_docs)
             
             total_added += len(batch_docs)
         
         return total_added
     
+    """
+    Embed a batch of chunks and add it to the collection
+    """
+    def _embed_and_add(self, batch_docs: List[Dict[str, Any]]):
+        # Generate embeddings for batch
+        texts = [doc["content"] for doc in batch_docs]
+        if hasattr(self.embeddings, 'embed_documents'):
+            embeddings = self.embeddings.embed_documents(texts)
+        else:
+            embeddings = self.embeddings.encode(texts).tolist()
+        
+        # Add batch to collection
+        ids = [doc["id"] for doc in batch_docs]
+        metadatas = [doc["metadata"] for doc in batch_docs]
+        
+        self.collection.add(
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
     """
     Split document into chunks
     """
@@ -262,48 +281,213 @@ class VectorDBService:
         max_results: int = 5,
         similarity_threshold: float = 0.3
     ) -> List[Dict[str, Any]]:
+        results = await self.search_similar_batch([query], max_results, similarity_threshold)
+        return results[0]
+    
+    """
+    Search several queries with one collection query
+    """
+    async def search_similar_batch(
+        self,
+        queries: List[str],
+        max_results: int = 5,
+        similarity_threshold: float = 0.3
+    ) -> List[List[Dict[str, Any]]]:
         if not self.collection:
             raise RuntimeError("Vector database not initialized")
         
-        try:            
-            # Check collection count first
-            count = self.collection.count()
-            if count == 0:
-                return []
-            
-            # Generate query embedding
-            if hasattr(self.embeddings, 'embed_query'):
-                query_embedding = self.embeddings.embed_query(query)
-            else:
-                query_embedding = self.embeddings.encode([query])[0].tolist()
-            
-            # Search collection
+        try:
+            # Embedding and the collection query are blocking, keep them off the event loop
+            return await asyncio.to_thread(self._search_similar_batch, queries, max_results, similarity_threshold)
+        except Exception as e:
+            logger.error("Error during similarity search: %s", e)
+            logger.error("Queries: %s, max_results: %s, threshold: %s", queries, max_results, similarity_threshold)
+            raise
+    
+    def _search_similar_batch(
+        self,
+        queries: List[str],
+        max_results: int,
+        similarity_threshold: float
+    ) -> List[List[Dict[str, Any]]]:
+        # Check collection count first
+        count = self.collection.count()
+        if count == 0:
+            return [[] for _ in queries]
+            
+        # Generate query embeddings
+        query_embeddings = self.embed_queries(queries)
+        
+        # Search collection
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=min(max_results, count),  # Don't ask for more than available
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        # Filter by similarity threshold
+        batch_results = []
+        for q, distances in enumerate(results["distances"] or [[] for _ in queries]):
+            filtered_results = []
+            for i, distance in enumerate(distances or []):
+                similarity = 1 - distance  # Convert distance to similarity
+                
+                if similarity >= similarity_threshold:
+                    result = {
+                        "content": results["documents"][q][i],
+                        "metadata": results["metadatas"][q][i],
+                        "similarity": similarity
+                    }
+                    filtered_results.append(result)
+            batch_results.append(filtered_results)
+        
+        return batch_results
+    
+    """
+    Embed search queries through the model's query path
+    """
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        if hasattr(self.embeddings, 'embed_query'):
+            return [self.embeddings.embed_query(query) for query in queries]
+        # Local sentence-transformers models still embed the whole batch in one forward pass
+        return self.embeddings.encode(queries).tolist()
+    
+    """
+    Check whether template metadata carries any of the wanted tags
+    """
+    @staticmethod
+    def _has_any_tag(metadata: Dict[str, Any], wanted_tags: set) -> bool:
+        template_tags = {tag.strip().lower() for tag in metadata.get("tags", "").split(",")}
+        return not wanted_tags.isdisjoint(template_tags)
+    
+    """
+    Template metadata ranked by similarity to the query, one entry per template
+    """
+    async def search_filtered(
+        self,
+        query: str,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> List[Dict[str, Any]]:
+        if not self.collection:
+            raise RuntimeError("Vector database not initialized")
+        
+        return await asyncio.to_thread(self._search_filtered, query, severity, tags, max_results)
+    
+    """
+    Yield template metadata ranked by similarity to the query
+    """
+    async def iter_search_filtered(
+        self,
+        query: str,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # A nearest-neighbour query can't be resumed, so results arrive all at once
+        for template in await self.search_filtered(query, severity, tags, max_results):
+            yield template
+    
+    def _search_filtered(
+        self,
+        query: str,
+        severity: Optional[str],
+        tags: Optional[List[str]],
+        max_results: int
+    ) -> List[Dict[str, Any]]:
+        count = self.collection.count()
+        if count == 0:
+            return []
+        
+        query_embeddings = self.embed_queries([query])
+        wanted_tags = {tag.strip().lower() for tag in tags} if tags else None
+        
+        # Several chunks of one template can match and tags are checked after the
+        # query, so the candidate pool widens until enough templates match or the
+        # filtered collection is exhausted
+        candidates = max_results * 4
+        while True:
+            n_results = min(candidates, count)
             results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=min(max_results, count),  # Don't ask for more than available
-                include=["documents", "metadatas", "distances"]
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where={"severity": severity} if severity else None,
+                include=["metadatas", "distances"]
             )
             
-            # Filter by similarity threshold
-            filtered_results = []
-            if results["distances"] and results["distances"][0]:
-                for i, distance in enumerate(results["distances"][0]):
-                    similarity = 1 - distance  # Convert distance to similarity
-                    
-                    if similarity >= similarity_threshold:
-                        result = {
-                            "content": results["documents"][0][i],
-                            "metadata": results["metadatas"][0][i],
-                            "similarity": similarity
-                        }
-                        filtered_results.append(result)
-            
-            return filtered_results
-            
-        except Exception as e:
-            logger.error(f"Error during similarity search: {e}")
-            logger.error(f"Query: '{query}', max_results: {max_results}, threshold: {similarity_threshold}")
-            raise
+            matches = []
+            seen = set()
+            for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+                template_key = metadata.get("file_path") or metadata.get("source_doc_id")
+                if template_key in seen:
+                    continue
+                if wanted_tags and not self._has_any_tag(metadata, wanted_tags):
+                    continue
+                seen.add(template_key)
+                matches.append({**metadata, "similarity": 1 - distance})
+                if len(matches) >= max_results:
+                    return matches
+            
+            if n_results >= count or len(results["ids"][0]) < n_results:
+                return matches
+            candidates *= 4
+    
+    """
+    Filter templates by metadata in a single collection scan
+    """
+    async def filter_templates(
+        self,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> List[Dict[str, Any]]:
+        return [template async for template in self.iter_filtered_templates(severity, tags, max_results)]
+    
+    """
+    Yield template metadata matching the filters page by page
+    """
+    async def iter_filtered_templates(
+        self,
+        severity: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        max_results: int = 10
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not self.collection:
+            raise RuntimeError("Vector database not initialized")
+        
+        # Only the first chunk of each template, so every template is returned once
+        conditions = [{"chunk_index": 0}]
+        if severity:
+            conditions.append({"severity": severity})
+        where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+        
+        # Tags are stored as a comma-separated string and can't be matched by
+        # ChromaDB, so with tags the collection is paged until enough templates
+        # match instead of being read whole
+        page_size = max(max_results, FILTER_PAGE_SIZE) if tags else max_results
+        wanted_tags = {tag.strip().lower() for tag in tags} if tags else None
+        returned = 0
+        offset = 0
+        while True:
+            results = await asyncio.to_thread(
+                self.collection.get,
+                where=where,
+                limit=page_size,
+                offset=offset,
+                include=["metadatas"]
+            )
+            page = results["metadatas"]
+            for metadata in page:
+                if wanted_tags and not self._has_any_tag(metadata, wanted_tags):
+                    continue
+                yield metadata
+                returned += 1
+                if returned >= max_results:
+                    return
+            if len(page) < page_size:
+                return
+            offset += page_size
     
     """
     Get collection statistics
@@ -313,10 +497,17 @@ class VectorDBService:
             return {"error": "Collection not initialized"}
         
         try:
-            count = self.collection.count()
+            # Clearing or reloading recreates the collection under a new id, possibly from
+            # another worker or the scheduler, so look it up again instead of trusting our handle
+            collection = self.client.get_collection(self.collection.name)
+            if collection.id != self.collection.id:
+                logger.info("Collection %s was recreated, switching to the new one", collection.name)
+                self.collection = collection
+            count = collection.count()
             return {
                 "total_documents": count,
-                "collection_name": self.collection.name
+                "collection_name": collection.name,
+                "collection_id": str(collection.id)
             }
         except Exception as e:
             return {
@@ -374,18 +565,18 @@ class VectorDBService:
                 
             # Skip empty files
             if not template_content.strip():
-                logger.debug(f"Skipping empty file: {template_path}")
+                logger.debug("Skipping empty file: %s", template_path)
                 return None
                 
             try:
-                template_data = yaml.safe_load(template_content)
+                template_data = yaml.load(template_content, Loader=SafeLoader)
             except yaml.YAMLError as e:
-                logger.warning(f"Failed to parse YAML in {template_path}: {e}")
+                logger.warning("Failed to parse YAML in %s: %s", template_path, e)
                 return None
             
             # Skip if not a valid template structure
             if not isinstance(template_data, dict):
-                logger.debug(f"Skipping non-dict YAML in {template_path}")
+                logger.debug("Skipping non-dict YAML in %s", template_path)
                 return None
             
             # Extract template information
@@ -394,13 +585,13 @@ class VectorDBService:
             
             # Skip templates without proper info section or empty info
             if not info or not isinstance(info, dict):
-                logger.debug(f"Skipping template without info section: {template_path}")
+                logger.debug("Skipping template without info section: %s", template_path)
                 return None
                 
             # Skip if no name in info (likely not a real template)
             template_name = info.get("name", "").strip()
             if not template_name:
-                logger.debug(f"Skipping template without name: {template_path}")
+                logger.debug("Skipping template without name: %s", template_path)
                 return None
             
             # Create document with ChromaDB-compatible metadata
@@ -412,7 +603,7 @@ class VectorDBService:
             description = info.get("description", "")
             
             # Ensure severity is valid
-            if severity not in ["info", "low", "medium", "high", "critical"]:
+            if severity not in VALID_SEVERITIES:
                 severity = "info"
             
             document = {
@@ -431,11 +622,11 @@ class VectorDBService:
                 }
             }
             
-            logger.debug(f"Successfully loaded template: {template_id} - {template_name}")
+            logger.debug("Successfully loaded template: %s - %s", template_id, template_name)
             return document
             
         except Exception as e:
-            logger.error(f"Error loading template {template_path}: {e}")
+            logger.error("Error loading template %s: %s", template_path, e)
             return None
     
     """
@@ -443,9 +634,22 @@ class VectorDBService:
     """
     async def bulk_load_templates(self, templates_dir: Path) -> int:
         if not templates_dir.exists():
-            logger.error(f"Templates directory not found: {templates_dir}")
+            logger.error("Templates directory not found: %s", templates_dir)
             return 0
         
+        # Reading and parsing thousands of files would otherwise block the event loop
+        documents = await asyncio.to_thread(self._load_templates_dir, templates_dir)
+        
+        if documents:
+            added_count = await self.add_documents(documents)
+            return added_count
+        
+        return 0
+    
+    """
+    Load every template file under a directory
+    """
+    def _load_templates_dir(self, templates_dir: Path) -> List[Dict[str, Any]]:
         documents = []
         yaml_files = list(templates_dir.rglob("*.yaml")) + list(templates_dir.rglob("*.yml"))
         
@@ -454,11 +658,7 @@ class VectorDBService:
             if document:
                 documents.append(document)
         
-        if documents:
-            added_count = await self.add_documents(documents)
-            return added_count
-        
-        return 0
+        return documents
     
     """
     Clear RAG data directory
@@ -472,7 +672,7 @@ class VectorDBService:
                 total_files = sum(1 for _ in rag_data_dir.rglob("*") if _.is_file())
                 
                 # Use safe removal method
-                self._safe_rmtree(str(rag_data_dir))
+                await asyncio.to_thread(self._safe_rmtree, str(rag_data_dir))
                 
                 return {
                     "status": "success",
@@ -513,18 +713,24 @@ class VectorDBService:
                 if templates_dir.exists():
                     # If directory exists, remove it first to avoid permission issues
                     logger.info("Removing existing templates directory")
-                    self._safe_rmtree(str(templates_dir))
+                    await asyncio.to_thread(self._safe_rmtree, str(templates_dir))
                 
                 # Always clone fresh to avoid git issues
-                result = subprocess.run(
-                    ["git", "clone", "--depth", "1", repo_url, str(templates_dir)],
-                    capture_output=True,
-                    text=True,
-                    timeout=300
+                # stdout is never read, so discard it instead of buffering it in memory
+                proc = await asyncio.create_subprocess_exec(
+                    "git", "clone", "--depth", "1", "--quiet", repo_url, str(templates_dir),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
                 )
+                try:
+                    _, stderr = await asyncio.wait_for(proc.communicate(), timeout=300)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    raise
                 
-                if result.returncode != 0:
-                    error_msg = f"Failed to download templates: {result.stderr}"
+                if proc.returncode != 0:
+                    error_msg = f"Failed to download templates: {stderr.decode(errors='replace')}"
                     logger.error(error_msg)
                     return {
                         "status": "failed",
@@ -543,7 +749,7 @@ class VectorDBService:
                     "templates_path": str(templates_dir)
                 }
                 
-            except subprocess.TimeoutExpired:
+            except asyncio.TimeoutError:
                 error_msg = "Template download timed out after 5 minutes"
                 logger.error(error_msg)
                 return {
@@ -1,16 +1,20 @@
 """
 Main entry point of the Nuclei Template Generator
 """
+import asyncio
 import logging
 import os
+import sys
 from contextlib import asynccontextmanager
 from pathlib import Path
+from types import MappingProxyType
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_fastapi_instrumentator import Instrumentator
 
-from app.api import router, TokenAuthMiddleware
+from app.api import router, TokenAuthMiddleware, ORJSONResponse, error_body, weak_etag, is_not_modified
 from app.core.config_service import ConfigService
 from app.core.nuclei_service import NucleiTemplateService
 
@@ -36,29 +40,60 @@ logging.basicConfig(
 logging.getLogger("watchfiles").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Fields of the /health response that never change for the lifetime of the process
+HEALTH_STATIC_FIELDS = MappingProxyType({
+    "message": settings.app.name,
+    "version": settings.app.version
+})
+
+
+async def refresh_collection_stats(app: FastAPI, interval: float):
+    """Keep a collection stats snapshot so health probes never wait on the vector DB"""
+    while True:
+        try:
+            app.state.collection_stats = await app.state.nuclei_service.rag_engine.get_collection_stats()
+        except Exception as e:
+            app.state.collection_stats = {
+                "collection_name": "unknown",
+                "total_documents": 0,
+                "error": str(e)
+            }
+        app.state.collection_stats_ready.set()
+        await asyncio.sleep(interval)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting Nuclei Template Generator")
     
     # Initialize Nuclei Template Service
     try:
-        nuclei_service = NucleiTemplateService()
+        nuclei_service = NucleiTemplateService.get_shared()
         await nuclei_service.rag_engine.initialize()
+        nuclei_service.rag_engine.search_batcher.start()
         app.state.nuclei_service = nuclei_service
     except Exception as e:
-        logger.error(f"Failed to initialize Nuclei Template Service: {e}")
+        logger.error("Failed to initialize Nuclei Template Service: %s", e)
         raise
     
+    app.state.collection_stats_ready = asyncio.Event()
+    stats_task = asyncio.create_task(
+        refresh_collection_stats(app, settings.rag.stats_refresh_interval)
+    )
+    
     yield
     
     logger.info("Shutting down Nuclei Template Generator")
+    stats_task.cancel()
+    await app.state.nuclei_service.rag_engine.close()
 
 
 app = FastAPI(
     title=settings.app.name,
     description="🕵️‍♂️ AI Genetate Template Nuclei For Cybersecurity Attack Surface Management (ASM).",
     version=settings.app.version,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -77,28 +112,54 @@ app.add_middleware(
 
 app.include_router(router, prefix="/api/v1", tags=["v1"])
 
+# Request metrics at /metrics (behind token auth); health probes would only add noise.
+# With several workers, set PROMETHEUS_MULTIPROC_DIR so the scrape covers all of them.
+# Buckets reach the generation timeout, since template generation takes seconds to minutes
+Instrumentator(excluded_handlers=["/health", "/metrics"]).instrument(
+    app,
+    latency_lowr_buckets=tuple(sorted({
+        0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60,
+        settings.template_generation.timeout
+    }))
+).expose(app, include_in_schema=False)
 
-@app.get("/health")
-async def health_check():
-    try:
-        stats = await app.state.nuclei_service.rag_engine.get_collection_stats()
-        status = "healthy" if not stats.get("error") else "degraded"
-        return {
-            "message": settings.app.name,
-            "version": settings.app.version,
-            "status": status,
-            "collection_name": stats.get("collection_name", ""),
-            "total_documents": stats.get("total_documents", 0)
-        }
-    except Exception as e:
-        return {
-            "message": settings.app.name,
-            "version": settings.app.version,
-            "status": "degraded",
-            "collection_name": "unknown",
-            "total_documents": 0,
-            "error": str(e)
+
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """Single error path for exceptions not handled by the endpoints"""
+    logger.error("Unhandled error on %s %s: %s", request.method, request.url.path, exc)
+    return ORJSONResponse(
+        status_code=500,
+        content={
+            "detail": error_body("Internal server error", {"exception": str(exc)})
         }
+    )
+
+
+@app.get("/health")
+async def health_check(request: Request, response: Response):
+    # The first probe waits for the initial snapshot, later ones read it directly
+    await app.state.collection_stats_ready.wait()
+    stats = app.state.collection_stats
+    etag = weak_etag(
+        "health",
+        stats.get("collection_id"),
+        stats.get("total_documents", 0),
+        stats.get("error")
+    )
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    body = {
+        **HEALTH_STATIC_FIELDS,
+        "status": "healthy" if not stats.get("error") else "degraded",
+        "collection_name": stats.get("collection_name", ""),
+        "total_documents": stats.get("total_documents", 0)
+    }
+    if stats.get("error"):
+        body["error"] = stats["error"]
+    return body
 
 
 if __name__ == "__main__":
@@ -108,5 +169,8 @@ if __name__ == "__main__":
         host=settings.app.host,
         port=settings.app.port,
         reload=True,
-        log_level=os.getenv("LOG_LEVEL", "info").lower()
+        log_level=os.getenv("LOG_LEVEL", "info").lower(),
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools"
     )
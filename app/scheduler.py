@@ -58,8 +58,8 @@ class StandaloneRAGScheduler:
         try:
             logger.info("Starting scheduled RAG data update...")
             
-            # Create NucleiTemplateService instance for the scheduled task
-            nuclei_service = NucleiTemplateService()
+            # Reuse the process-wide service so the embedding model and LLM client survive between runs
+            nuclei_service = NucleiTemplateService.get_shared()
             
             # Initialize RAG engine if needed
             if not nuclei_service.rag_engine.initialized:
@@ -68,19 +68,19 @@ class StandaloneRAGScheduler:
             # Perform the RAG data update using templates directory from config
             templates_dir = self.settings.nuclei.templates_dir
             rag_data_path = str(Path(templates_dir).parent)
-            result = await nuclei_service.rag_engine.vector_db.update_rag_data(
+            result = await nuclei_service.rag_engine.update_rag_data(
                 rag_data_path=rag_data_path
             )
             
             if result["status"] == "success":
-                logger.info(f"Scheduled RAG data update completed successfully: {result['templates_loaded']} templates loaded")
+                logger.info("Scheduled RAG data update completed successfully: %s templates loaded", result['templates_loaded'])
             elif result["status"] == "partial_failure":
-                logger.warning(f"Scheduled RAG data update completed with warnings: {result['message']}")
+                logger.warning("Scheduled RAG data update completed with warnings: %s", result['message'])
             else:
-                logger.error(f"Scheduled RAG data update failed: {result['message']}")
+                logger.error("Scheduled RAG data update failed: %s", result['message'])
                 
         except Exception as e:
-            logger.error(f"Error in scheduled RAG data update: {e}")
+            logger.error("Error in scheduled RAG data update: %s", e)
     
     def setup_scheduler(self):
         """
@@ -111,7 +111,7 @@ class StandaloneRAGScheduler:
             if not (0 <= hour <= 23) or not (0 <= minute <= 59):
                 raise ValueError("Hour must be 0-23, minute must be 0-59")
             
-            logger.info(f"AUTO_UPDATE_TEMPLATE_NUCLEI is enabled, setting up daily RAG data updates at {schedule_time}")
+            logger.info("AUTO_UPDATE_TEMPLATE_NUCLEI is enabled, setting up daily RAG data updates at %s", schedule_time)
             
             # Schedule daily update at specified time
             self.scheduler.add_job(
@@ -122,11 +122,11 @@ class StandaloneRAGScheduler:
                 replace_existing=True
             )
             
-            logger.info(f"Scheduler configured successfully - Daily RAG updates scheduled at {schedule_time}")
+            logger.info("Scheduler configured successfully - Daily RAG updates scheduled at %s", schedule_time)
             return True
             
         except (ValueError, IndexError) as e:
-            logger.error(f"Invalid TIME_UPDATE_TEMPLATE format '{schedule_time}'. Expected HH:MM format (e.g., '00:00', '14:30'). Error: {e}")
+            logger.error("Invalid TIME_UPDATE_TEMPLATE format '%s'. Expected HH:MM format (e.g., '00:00', '14:30'). Error: %s", schedule_time, e)
             logger.error("Scheduler not started due to invalid time configuration")
             return False
     
@@ -143,7 +143,7 @@ class StandaloneRAGScheduler:
             self.running = True
             logger.info("Scheduler started successfully")
         except Exception as e:
-            logger.error(f"Failed to start scheduler: {e}")
+            logger.error("Failed to start scheduler: %s", e)
             raise
     
     def shutdown(self):
@@ -167,7 +167,7 @@ async def main():
     
     # Setup signal handlers for graceful shutdown
     def signal_handler(signum, frame):
-        logger.info(f"Received signal {signum}, initiating graceful shutdown...")
+        logger.info("Received signal %s, initiating graceful shutdown...", signum)
         scheduler.shutdown()
         sys.exit(0)
     
@@ -203,5 +203,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Scheduler stopped by user")
     except Exception as e:
-        logger.error(f"Scheduler failed with error: {e}")
+        logger.error("Scheduler failed with error: %s", e)
         sys.exit(1)
\ No newline at end of file